@@ -1,26 +1,35 @@
 import asyncio
 import logging
 import os
-import re
 import time
-import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from urllib.parse import urljoin, urlparse
 from dotenv import load_dotenv
 
-import requests
-import schedule
-from bs4 import BeautifulSoup
+from aiolimiter import AsyncLimiter
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from cachetools import TTLCache
+from celery import Celery, group
+from celery.schedules import crontab
+from celery.signals import worker_process_init
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, HttpUrl
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import create_engine, bindparam, or_, select, text, insert, update, Column, Index, BigInteger, Integer, String, Float, DateTime, Boolean, TypeDecorator
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql import func
 from telegram import Bot
 from telegram.error import TelegramError
 
+from scrapers import (
+    CHECK_CONCURRENCY_PER_HOST, ScraperFactory, canonicalize_url, close_http_session, get_http_session, url_hash,
+)
+
 load_dotenv()
 
 # Configure logging
@@ -29,15 +38,46 @@ logger = logging.getLogger(__name__)
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg2://jack@localhost:5432/price_tracker")
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(
+    DATABASE_URL,
+    echo=bool(os.getenv("SQL_DEBUG")),  # statement logging is costly; opt in when debugging
+    query_cache_size=1200,
+    # Multi-row UPDATEs go out through psycopg2's execute_batch (pages of 100)
+    # instead of one statement per row; INSERTs keep the VALUES rewrite
+    executemany_mode='values_plus_batch',
+    pool_size=10,
+    max_overflow=20,
+    pool_pre_ping=True,
+    pool_recycle=1800
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 def reset_database():
+    with engine.begin() as conn:
+        conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS product_stats"))
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    create_upcoming_partitions()
+    create_stats_view()
     print("Database reset complete!")
 
 
+# Prices are stored as integer cents and exposed to Python as floats
+def to_cents(amount: Optional[float]) -> Optional[int]:
+    """Convert a price to integer cents"""
+    return None if amount is None else round(amount * 100)
+
+class Cents(TypeDecorator):
+    """Integer cents column that reads and writes float prices"""
+    impl = Integer
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return to_cents(value)
+    
+    def process_result_value(self, value, dialect):
+        return None if value is None else value / 100
+
 # Models
 class Product(Base):
     __tablename__ = "products"
@@ -45,29 +85,113 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     url = Column(String, unique=True, index=True)
-    current_price = Column(Float)
-    target_price = Column(Float)
-    lowest_price = Column(Float)
-    highest_price = Column(Float)
+    url_hash = Column(BigInteger, index=True)  # url_hash(url), for duplicate checks
+    current_price = Column(Cents)
+    target_price = Column(Cents)
+    lowest_price = Column(Cents)
+    highest_price = Column(Cents)
     last_checked = Column(DateTime)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.timezone('utc', func.now()))
     user_id = Column(String, index=True)
     store = Column(String, default="amazon")  # Added store field to track which marketplace
+    last_alert_at = Column(DateTime)
+    # Cache validators from the last full page fetch, sent back on conditional requests
+    etag = Column(String)
+    last_modified = Column(String)
+    
+    # Active-product counts read this small index instead of the table
+    __table_args__ = (
+        Index('ix_products_active', 'id', postgresql_where=(is_active == True)),
+        # Alert evaluation filters active products by price
+        Index('ix_products_active_price', 'is_active', 'current_price'),
+    )
 
 class PriceHistory(Base):
     __tablename__ = "price_history"
     
-    id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, index=True)
-    price = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    product_id = Column(Integer)
+    price = Column(Cents)
+    # Part of the primary key because the table is partitioned on it
+    timestamp = Column(DateTime, primary_key=True, server_default=func.timezone('utc', func.now()), index=True)
+    
+    __table_args__ = (
+        # History lookups filter by product and scan a time range
+        Index('ix_ph_product_ts', 'product_id', 'timestamp'),
+        # Monthly partitions: time-bounded queries skip old months, inserts hit a small hot one
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
+
+def _next_month(month: datetime) -> datetime:
+    """First day of the month after the given month start"""
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def ensure_price_history_partitions(conn, since: Optional[datetime] = None):
+    """Create the monthly price_history partitions from `since` through next month"""
+    now = datetime.utcnow()
+    month = (since or now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = _next_month(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+    has_default = conn.execute(text("SELECT to_regclass('price_history_default') IS NOT NULL")).scalar()
+    while month <= last:
+        following = _next_month(month)
+        partition = f"price_history_{month:%Y_%m}"
+        if conn.execute(text("SELECT to_regclass(:name) IS NULL"), {'name': partition}).scalar():
+            # Postgres won't create a partition for rows the default partition
+            # already holds, so a late month's rows are moved out and back in
+            if has_default:
+                conn.execute(text("CREATE TEMP TABLE price_history_moved (LIKE price_history) ON COMMIT DROP"))
+                conn.execute(text(
+                    "WITH moved AS (DELETE FROM price_history_default WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+                    "INSERT INTO price_history_moved SELECT * FROM moved"
+                ), {'start': month, 'end': following})
+            conn.execute(text(
+                f"CREATE TABLE {partition} PARTITION OF price_history "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+            ))
+            if has_default:
+                conn.execute(text("INSERT INTO price_history SELECT * FROM price_history_moved"))
+                conn.execute(text("DROP TABLE price_history_moved"))
+        month = following
+    # Catches rows if the monthly job ever falls behind, so inserts never fail
+    if not has_default:
+        conn.execute(text("CREATE TABLE price_history_default PARTITION OF price_history DEFAULT"))
+
+def create_upcoming_partitions():
+    """Make sure this and next month's price_history partitions exist"""
+    # Inserts still land in the default partition without them, so a failure
+    # here is logged rather than allowed to stop startup or the scheduler
+    try:
+        with engine.begin() as conn:
+            ensure_price_history_partitions(conn)
+    except Exception as e:
+        logger.error(f"❌ Failed to create price history partitions: {e}")
+
+SCHEMA_LOCK_ID = 727210  # pg advisory lock key held while the schema is migrated
+
+@contextmanager
+def schema_lock():
+    """Serialize schema changes across the app, worker and beat processes"""
+    # Session-level lock on an autocommit connection, polled rather than blocking:
+    # a waiting pg_advisory_lock() call holds a snapshot, and CREATE INDEX
+    # CONCURRENTLY in the holder's migrations would wait on it forever
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        while not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': SCHEMA_LOCK_ID}).scalar():
+            time.sleep(0.5)
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': SCHEMA_LOCK_ID})
 
 def check_and_update_schema():
-    """Check if store column exists and add it if missing"""
+    """Bring an existing database up to date with the current models.
+    
+    Must run under schema_lock(): the columns are inspected once up front, so a
+    second process migrating at the same time would act on stale state (and
+    convert prices to cents twice).
+    """
     from sqlalchemy import inspect, text
     
-    engine = create_engine(DATABASE_URL)
     inspector = inspect(engine)
     columns = [col['name'] for col in inspector.get_columns('products')]
     
@@ -77,11 +201,147 @@ def check_and_update_schema():
             conn.execute(text("ALTER TABLE products ADD COLUMN store VARCHAR DEFAULT 'amazon'"))
             conn.commit()
         logger.info("Schema update complete!")
+    
+    if 'last_alert_at' not in columns:
+        logger.info("Adding missing 'last_alert_at' column to products table...")
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE products ADD COLUMN last_alert_at TIMESTAMP"))
+            conn.commit()
+        logger.info("Schema update complete!")
+    
+    if 'url_hash' not in columns:
+        logger.info("Adding missing 'url_hash' column to products table...")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE products ADD COLUMN url_hash BIGINT"))
+            rows = conn.execute(text("SELECT id, url FROM products WHERE url IS NOT NULL")).all()
+            if rows:
+                conn.execute(
+                    text("UPDATE products SET url_hash = :url_hash WHERE id = :id"),
+                    [{'id': row.id, 'url_hash': url_hash(row.url)} for row in rows]
+                )
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_url_hash ON products (url_hash)"))
+        logger.info("Schema update complete!")
+    
+    if 'etag' not in columns:
+        logger.info("Adding missing cache validator columns to products table...")
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE products ADD COLUMN etag VARCHAR, ADD COLUMN last_modified VARCHAR"))
+            conn.commit()
+        logger.info("Schema update complete!")
+    
+    price_column = next(col for col in inspector.get_columns('products') if col['name'] == 'current_price')
+    if isinstance(price_column['type'], Float):
+        logger.info("Converting prices to integer cents...")
+        with engine.begin() as conn:
+            conn.execute(text(
+                "ALTER TABLE products "
+                "ALTER COLUMN current_price TYPE INTEGER USING round(current_price * 100), "
+                "ALTER COLUMN target_price TYPE INTEGER USING round(target_price * 100), "
+                "ALTER COLUMN lowest_price TYPE INTEGER USING round(lowest_price * 100), "
+                "ALTER COLUMN highest_price TYPE INTEGER USING round(highest_price * 100)"
+            ))
+            if inspector.has_table('price_history'):
+                conn.execute(text("ALTER TABLE price_history ALTER COLUMN price TYPE INTEGER USING round(price * 100)"))
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_active_price ON products (is_active, current_price)"))
+        logger.info("Schema update complete!")
+    
+    if 'ix_products_active' not in [index['name'] for index in inspector.get_indexes('products')]:
+        logger.info("Adding partial index on active products...")
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_active ON products (id) WHERE is_active"))
+        logger.info("Schema update complete!")
+    
+    if inspector.has_table('price_history'):
+        indexes = [index['name'] for index in inspector.get_indexes('price_history')]
+        if 'ix_ph_product_ts' not in indexes:
+            logger.info("Adding (product_id, timestamp) index to price_history table...")
+            # CONCURRENTLY can't run inside a transaction block
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ph_product_ts ON price_history (product_id, timestamp)"))
+                conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_price_history_product_id"))
+            logger.info("Schema update complete!")
+        
+        timestamp_column = next(col for col in inspector.get_columns('price_history') if col['name'] == 'timestamp')
+        if timestamp_column['default'] is None:
+            logger.info("Moving timestamp defaults to the database server...")
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text("ALTER TABLE price_history ALTER COLUMN timestamp SET DEFAULT timezone('utc', now())"))
+                conn.execute(text("ALTER TABLE products ALTER COLUMN created_at SET DEFAULT timezone('utc', now())"))
+                conn.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_price_history_timestamp ON price_history (timestamp)"))
+            logger.info("Schema update complete!")
+        
+        with engine.connect() as conn:
+            partitioned = conn.execute(text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'price_history'::regclass)"
+            )).scalar()
+        if not partitioned:
+            logger.info("Partitioning price_history by month (table is locked while rows are copied)...")
+            with engine.begin() as conn:
+                # The stats view depends on the table; it is recreated at startup
+                conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS product_stats"))
+                
+                # Move the old table and the names it holds out of the way
+                conn.execute(text("ALTER TABLE price_history RENAME TO price_history_unpartitioned"))
+                conn.execute(text("ALTER TABLE price_history_unpartitioned RENAME CONSTRAINT price_history_pkey TO price_history_unpartitioned_pkey"))
+                conn.execute(text("ALTER SEQUENCE IF EXISTS price_history_id_seq RENAME TO price_history_unpartitioned_id_seq"))
+                old_indexes = conn.execute(text(
+                    "SELECT indexname FROM pg_indexes WHERE tablename = 'price_history_unpartitioned' "
+                    "AND indexname <> 'price_history_unpartitioned_pkey'"
+                )).scalars().all()
+                for index_name in old_indexes:
+                    conn.execute(text(f"DROP INDEX {index_name}"))
+                
+                PriceHistory.__table__.create(conn)
+                oldest = conn.execute(text("SELECT min(timestamp) FROM price_history_unpartitioned")).scalar()
+                ensure_price_history_partitions(conn, oldest)
+                
+                conn.execute(text(
+                    "INSERT INTO price_history (id, product_id, price, timestamp) "
+                    "SELECT id, product_id, price, COALESCE(timestamp, timezone('utc', now())) FROM price_history_unpartitioned"
+                ))
+                conn.execute(text("SELECT setval('price_history_id_seq', (SELECT COALESCE(max(id), 0) + 1 FROM price_history), false)"))
+                conn.execute(text("DROP TABLE price_history_unpartitioned"))
+            logger.info("Schema update complete!")
 
 # Call this function before creating tables
-check_and_update_schema()
+with schema_lock():
+    check_and_update_schema()
+    
+    Base.metadata.create_all(bind=engine)
+    create_upcoming_partitions()
+
+# Pre-aggregated counts for /stats, refreshed on a schedule instead of per request
+STATS_VIEW_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS product_stats AS
+SELECT
+    1 AS id,
+    count(*) AS total_products,
+    count(*) FILTER (WHERE is_active) AS active_products,
+    count(*) FILTER (WHERE store = 'amazon') AS amazon_products,
+    count(*) FILTER (WHERE store = 'flipkart') AS flipkart_products,
+    (SELECT count(*) FROM price_history
+     WHERE timestamp >= timezone('utc', now()) - interval '1 day') AS recent_checks_24h,
+    timezone('utc', now()) AS refreshed_at
+FROM products
+"""
+STATS_REFRESH_MINUTES = 5
+
+def create_stats_view():
+    """Create the product_stats materialized view if it doesn't exist yet"""
+    with engine.begin() as conn:
+        conn.execute(text(STATS_VIEW_SQL))
+        # A unique index lets the view be refreshed without blocking readers
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_product_stats_id ON product_stats (id)"))
 
-Base.metadata.create_all(bind=engine)
+def refresh_stats_view():
+    """Recompute the product_stats materialized view"""
+    with engine.begin() as conn:
+        conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY product_stats"))
+
+with schema_lock():
+    create_stats_view()
 
 # Pydantic models
 class ProductCreate(BaseModel):
@@ -103,7 +363,12 @@ class ProductResponse(BaseModel):
     created_at: datetime
     store: str
 
-class PriceAlert(BaseModel):
+# Columns read straight into ProductResponse, skipping ORM object construction
+PRODUCT_RESPONSE_COLUMNS = [Product.__table__.c[field] for field in ProductResponse.model_fields]
+
+# Internal alert payload, never parsed from a request
+@dataclass(slots=True)
+class PriceAlert:
     product_id: int
     product_name: str
     current_price: float
@@ -113,260 +378,11 @@ class PriceAlert(BaseModel):
 # Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "YOUR_CHAT_ID_HERE")
-
-# Base scraper class
-class BaseScraper:
-    def __init__(self):
-        self.session = requests.Session()
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none'
-        }
-        self.session.headers.update(self.headers)
-    
-    def extract_price(self, text: str) -> Optional[float]:
-        """Extract numeric price from text"""
-        if not text:
-            return None
-            
-        # Remove currency symbols, commas, and other non-numeric characters
-        price_text_clean = re.sub(r'[₹$€£¥,\s]', '', text)
-        price_match = re.search(r'[\d]+\.?\d*', price_text_clean)
-        
-        if price_match:
-            return float(price_match.group())
-        return None
-
-# Amazon scraper class
-class AmazonScraper(BaseScraper):
-    def get_product_info(self, url: str) -> Dict[str, Any]:
-        """Extract product information from Amazon URL"""
-        try:
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract product name
-            name_selectors = [
-                '#productTitle',
-                '.product-title',
-                'h1.a-size-large',
-                'h1.a-size-base-plus'
-            ]
-            
-            name = None
-            for selector in name_selectors:
-                element = soup.select_one(selector)
-                if element:
-                    name = element.get_text().strip()
-                    break
-            
-            # Extract price - Updated selectors for the new structure
-            price_selectors = [
-                '.a-price.priceToPay .a-price-whole',
-                '.a-price.reinventPricePriceToPayMargin .a-price-whole',
-                '.a-price.aok-align-center .a-price-whole',
-                '.a-price .a-price-whole',
-                '.a-price.a-text-price.a-size-medium.apexPriceToPay .a-offscreen',
-                '.a-price-whole',
-                '.a-price .a-offscreen',
-                '.priceBlockBuyingPriceString',
-                '.priceBlockDealPriceString',
-                'span.a-price-range'
-            ]
-            
-            price = None
-            for selector in price_selectors:
-                element = soup.select_one(selector)
-                if element:
-                    price_text = element.get_text().strip()
-                    price = self.extract_price(price_text)
-                    if price:
-                        break
-            
-            # If price_whole didn't work, try getting from price symbol + whole combination
-            if price is None:
-                price_container = soup.select_one('.a-price.priceToPay') or soup.select_one('.a-price.reinventPricePriceToPayMargin')
-                if price_container:
-                    price_whole = price_container.select_one('.a-price-whole')
-                    price_fraction = price_container.select_one('.a-price-fraction')
-                    
-                    if price_whole:
-                        whole_text = price_whole.get_text().strip()
-                        fraction_text = price_fraction.get_text().strip() if price_fraction else "00"
-                        
-                        # Combine whole and fraction parts
-                        try:
-                            price = float(f"{whole_text}.{fraction_text}")
-                        except ValueError:
-                            # Fallback to just whole number
-                            price = self.extract_price(whole_text)
-            
-            logger.info(f"Scraped Amazon product: {name}, Price: {price}")
-            
-            return {
-                'name': name,
-                'price': price,
-                'success': True
-            }
-            
-        except requests.RequestException as e:
-            logger.error(f"Request error for {url}: {e}")
-            return {'success': False, 'error': str(e)}
-        except Exception as e:
-            logger.error(f"Parsing error for {url}: {e}")
-            return {'success': False, 'error': str(e)}
-    
-    def is_valid_url(self, url: str) -> bool:
-        """Check if URL is a valid Amazon product URL"""
-        parsed = urlparse(url)
-        return 'amazon' in parsed.netloc and '/dp/' in parsed.path
-
-# Flipkart scraper class
-import random
-import time
-from fake_useragent import UserAgent
-
-# Add to your imports at the top
-import cloudscraper  # For bypassing Cloudflare protection
-
-# Update your FlipkartScraper class
-class FlipkartScraper(BaseScraper):
-    def __init__(self):
-        super().__init__()
-        # Use cloudscraper to bypass Cloudflare protection
-        self.scraper = cloudscraper.create_scraper()
-        self.ua = UserAgent()
-        self.set_random_headers()
-    
-    def set_random_headers(self):
-        """Set random headers to avoid detection"""
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0',
-            'TE': 'trailers',
-        }
-        self.scraper.headers.update(self.headers)
-    
-    def get_product_info(self, url: str) -> Dict[str, Any]:
-        """Extract product information from Flipkart URL with retries"""
-        max_retries = 3
-        attempt = 0
-        name, price, old_price, discount, reviews = None, None, None, None, None
-
-        while attempt < max_retries and not (name and price):
-            try:
-                time.sleep(random.uniform(2, 5))  # random delay
-                self.set_random_headers()  # rotate headers each attempt
-                response = self.scraper.get(url, timeout=15)
-                response.raise_for_status()
-
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # Product name
-                name_selectors = [
-                    'h1._6EBuvT span.VU-ZEz',
-                    'span.VU-ZEz',
-                    'h1._6EBuvT',
-                    'span.B_NuCI',
-                    'h1.yhB1nd',
-                    'h1._2Kn22P',
-                ]
-                for selector in name_selectors:
-                    element = soup.select_one(selector)
-                    if element:
-                        name = element.get_text(strip=True)
-                        break
-
-                # Price
-                price_selectors = [
-                    'div.Nx9bqj.CxhGGd',   # new Flipkart structure
-                    'div._30jeq3._16Jk6d',
-                    'div._30jeq3._1_WHN1',
-                ]
-                for selector in price_selectors:
-                    element = soup.select_one(selector)
-                    if element:
-                        price = self.extract_price(element.get_text(strip=True))
-                        if price:
-                            break
-
-                # Old price
-                old_price_el = soup.select_one('div.yRaY8j.A6+E6v')
-                if old_price_el:
-                    old_price = self.extract_price(old_price_el.get_text(strip=True))
-
-                # Discount
-                discount_el = soup.select_one('div.UkUFwK.WW8yVX span')
-                if discount_el:
-                    discount = discount_el.get_text(strip=True)
-
-                # Reviews
-                reviews_el = soup.select_one('span.Wphh3N')
-                if reviews_el:
-                    reviews = reviews_el.get_text(strip=True)
-
-                if name and price:
-                    logger.info(f"✅ Scraped Flipkart product (attempt {attempt+1}): {name} - {price}")
-                    return {
-                        'name': name,
-                        'price': price,
-                        'old_price': old_price,
-                        'discount': discount,
-                        'reviews': reviews,
-                        'success': True
-                    }
-
-            except Exception as e:
-                logger.warning(f"⚠️ Attempt {attempt+1} failed for {url}: {e}")
-
-            attempt += 1
-
-        logger.error(f"❌ Failed to scrape Flipkart product after {max_retries} attempts: {url}")
-        return {'success': False, 'error': 'Unable to fetch product details after retries'}
-
-    def is_valid_url(self, url: str) -> bool:
-        """Check if URL is a valid Flipkart product URL"""
-        parsed = urlparse(url)
-        return 'flipkart.com' in parsed.netloc and ('/p/' in parsed.path or '/product/' in parsed.path)
-# Scraper factory
-class ScraperFactory:
-    @staticmethod
-    def get_scraper(url: str) -> BaseScraper:
-        """Get appropriate scraper based on URL"""
-        if 'amazon' in url:
-            return AmazonScraper()
-        elif 'flipkart' in url:
-            return FlipkartScraper()
-        else:
-            raise ValueError(f"Unsupported store URL: {url}")
-    
-    @staticmethod
-    def get_store_name(url: str) -> str:
-        """Get store name from URL"""
-        if 'amazon' in url:
-            return "amazon"
-        elif 'flipkart' in url:
-            return "flipkart"
-        else:
-            return "unknown"
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
+HOST_REQUESTS_PER_MINUTE = int(os.getenv("HOST_REQUESTS_PER_MINUTE", "20"))
+ALERT_COOLDOWN = timedelta(days=1)  # Minimum gap between alerts for the same product
+CHECK_BATCH_SIZE = 50  # Products fetched and committed per transaction
+HISTORY_MAX_POINTS = 5000  # Upper bound on rows returned by the history endpoint
 
 # Telegram notification service
 class TelegramNotifier:
@@ -380,13 +396,15 @@ class TelegramNotifier:
             # Determine currency symbol based on URL
             currency = "₹" if any(x in alert.url for x in ["amazon.in", "flipkart.com"]) else "$"
             
-            message = f"🚨 *PRICE ALERT!* 🚨\n\n"
-            message += f"📦 *Product:* {alert.product_name[:50]}...\n\n"
-            message += f"💰 *Current Price:* {currency}{alert.current_price:.2f}\n"
-            message += f"🎯 *Your Target:* {currency}{alert.target_price:.2f}\n"
-            message += f"💸 *You Save:* {currency}{abs(alert.target_price - alert.current_price):.2f}\n\n"
-            message += f"🔗 [🛒 BUY NOW]({alert.url})\n\n"
-            message += f"⏰ *Alert Time:* {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            message = (
+                f"🚨 *PRICE ALERT!* 🚨\n\n"
+                f"📦 *Product:* {alert.product_name[:50]}...\n\n"
+                f"💰 *Current Price:* {currency}{alert.current_price:.2f}\n"
+                f"🎯 *Your Target:* {currency}{alert.target_price:.2f}\n"
+                f"💸 *You Save:* {currency}{abs(alert.target_price - alert.current_price):.2f}\n\n"
+                f"🔗 [🛒 BUY NOW]({alert.url})\n\n"
+                f"⏰ *Alert Time:* {datetime.now():%Y-%m-%d %H:%M:%S}"
+            )
             
             await self.bot.send_message(
                 chat_id=self.chat_id,
@@ -401,6 +419,30 @@ class TelegramNotifier:
         except Exception as e:
             logger.error(f"❌ Unexpected error sending alert: {e}")
 
+# Alerts are queued by price checks and sent by one background worker, so a
+# check never waits on Telegram
+TELEGRAM_CHAT_RATE_LIMIT = AsyncLimiter(1, 1)  # Telegram allows about one message per second per chat
+_alert_queue: Optional[asyncio.Queue] = None
+_alert_worker: Optional[asyncio.Task] = None
+
+async def send_queued_alerts(queue: asyncio.Queue):
+    """Send queued price alerts one by one, paced to Telegram's per-chat limit"""
+    while True:
+        alert = await queue.get()
+        try:
+            async with TELEGRAM_CHAT_RATE_LIMIT:
+                await notifier.send_price_alert(alert)
+        finally:
+            queue.task_done()
+
+def queue_price_alert(alert: PriceAlert):
+    """Hand an alert to the sender task, starting it on the running loop if needed"""
+    global _alert_queue, _alert_worker
+    if _alert_worker is None or _alert_worker.done():
+        _alert_queue = asyncio.Queue()
+        _alert_worker = asyncio.create_task(send_queued_alerts(_alert_queue))
+    _alert_queue.put_nowait(alert)
+
 # Database dependency
 def get_db():
     db = SessionLocal()
@@ -409,114 +451,320 @@ def get_db():
     finally:
         db.close()
 
-# Background task functions
-def check_all_prices_sync():
-    """Synchronous wrapper for price checking"""
+@contextmanager
+def session_scope():
+    """Database session for work that runs outside a request"""
     db = SessionLocal()
     try:
-        asyncio.run(check_all_prices(db))
-    except Exception as e:
-        logger.error(f"Error in scheduled price check: {e}")
+        yield db
     finally:
         db.close()
 
-async def check_all_prices(db: Session):
-    """Check prices for all active products"""
-    products = db.query(Product).filter(Product.is_active == True).all()
+# Background task functions
+async def check_all_prices_job():
+    """Scheduled price check with its own database session"""
+    try:
+        with session_scope() as db:
+            await check_all_prices(db)
+    except Exception as e:
+        logger.error(f"Error in scheduled price check: {e}")
+
+def record_price(product: Product, new_price: float, checked_at: datetime,
+                 updates: List[Dict[str, Any]], history_rows: List[Dict[str, Any]],
+                 validators: Optional[Dict[str, Optional[str]]] = None):
+    """Queue the row changes for a freshly scraped price"""
+    old_price = product.current_price
     
-    logger.info(f"🔍 Checking prices for {len(products)} active products...")
+    # Product record with the new price and the page's new cache validators;
+    # price bounds are folded in by the database
+    validators = validators or {}
+    updates.append({
+        'id': product.id,
+        'price': new_price,
+        'checked_at': checked_at,
+        'etag': validators.get('etag'),
+        'last_modified': validators.get('last_modified'),
+    })
     
-    alerts_sent = 0
-    for product in products:
-        try:
+    # Price history entry
+    history_rows.append({'product_id': product.id, 'price': new_price, 'timestamp': checked_at})
+    
+    if old_price != new_price:
+        logger.info(f"💰 Price updated for {product.name}: {old_price} -> {new_price}")
+    else:
+        logger.info(f"📊 Price unchanged for {product.name}: {new_price}")
+
+def record_not_modified(product: Product, checked_at: datetime, updates: List[Dict[str, Any]]):
+    """Queue a check of a page the store reported unchanged (HTTP 304)"""
+    updates.append({
+        'id': product.id,
+        'price': None,
+        'checked_at': checked_at,
+        'etag': product.etag,
+        'last_modified': product.last_modified,
+    })
+    logger.info(f"📊 Page unchanged for {product.name}: {product.current_price}")
+
+# LEAST/GREATEST skip NULLs, so a NULL price (page not modified) keeps every price column
+# as is, and a product without bounds yet takes the new price as both
+PRODUCT_PRICE_UPDATE = text("""
+    UPDATE products SET
+        current_price = COALESCE(:price, current_price),
+        lowest_price = LEAST(lowest_price, :price),
+        highest_price = GREATEST(highest_price, :price),
+        last_checked = :checked_at,
+        etag = :etag,
+        last_modified = :last_modified
+    WHERE id = :id
+""").bindparams(bindparam('price', type_=Cents))
+
+def save_price_updates(db: Session, updates: List[Dict[str, Any]], history_rows: List[Dict[str, Any]]):
+    """Write queued product updates and price history rows in a single transaction"""
+    if not updates:
+        return
+    db.execute(PRODUCT_PRICE_UPDATE, updates)
+    if history_rows:
+        db.execute(insert(PriceHistory), history_rows)
+    db.commit()
+
+def claim_price_alerts(db: Session, product_ids: List[int]) -> List[PriceAlert]:
+    """Mark checked products at or below target as alerted and return their alerts"""
+    if not product_ids:
+        return []
+    
+    # Evaluated and claimed in one statement, so concurrent workers never double-send
+    now = datetime.utcnow()
+    rows = db.execute(
+        update(Product)
+        .where(
+            Product.id.in_(product_ids),
+            Product.is_active == True,
+            Product.current_price <= Product.target_price,
+            or_(Product.last_alert_at == None, Product.last_alert_at < now - ALERT_COOLDOWN)
+        )
+        .values(last_alert_at=now)
+        .returning(Product.id, Product.name, Product.current_price, Product.target_price, Product.url)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    
+    return [
+        PriceAlert(
+            product_id=row.id,
+            product_name=row.name,
+            current_price=row.current_price,
+            target_price=row.target_price,
+            url=row.url
+        )
+        for row in rows
+    ]
+
+# Request rate per store, shared by every batch and run so pacing holds across them
+_host_rate_limits: Dict[str, AsyncLimiter] = {}
+
+async def fetch_product_pages(products: List[Product]) -> List[Any]:
+    """Scrape a batch of products over the shared HTTP session, paced per host"""
+    http = get_http_session()
+    
+    # Each store gets its own limits, so different stores are scraped in parallel
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+    
+    async def scrape(product: Product) -> Dict[str, Any]:
+        host = urlparse(product.url).netloc
+        semaphore = host_limits.setdefault(host, asyncio.Semaphore(CHECK_CONCURRENCY_PER_HOST))
+        rate_limit = _host_rate_limits.get(host)
+        if rate_limit is None:
+            rate_limit = _host_rate_limits[host] = AsyncLimiter(HOST_REQUESTS_PER_MINUTE, 60)
+        async with semaphore, rate_limit:
             logger.info(f"Checking: {product.name}")
             
             # Get appropriate scraper for the product's store
             scraper = ScraperFactory.get_scraper(product.url)
-            product_info = scraper.get_product_info(product.url)
-            
-            if product_info['success'] and product_info['price']:
-                old_price = product.current_price
-                new_price = product_info['price']
-                
-                # Update product record
-                product.current_price = new_price
-                product.last_checked = datetime.utcnow()
-                
-                # Update price bounds
-                if not product.lowest_price or new_price < product.lowest_price:
-                    product.lowest_price = new_price
-                if not product.highest_price or new_price > product.highest_price:
-                    product.highest_price = new_price
-                
-                db.commit()
-                
-                # Add to price history
-                price_history = PriceHistory(
-                    product_id=product.id,
-                    price=new_price
-                )
-                db.add(price_history)
-                db.commit()
+            validators = {'etag': product.etag, 'last_modified': product.last_modified}
+            return await scraper.get_product_info_async(product.url, http, validators)
+    
+    return await asyncio.gather(*(scrape(p) for p in products), return_exceptions=True)
+
+# Only what a scheduled check reads from each product, as plain rows
+CHECK_COLUMNS = (Product.id, Product.name, Product.url, Product.current_price, Product.etag, Product.last_modified)
+
+async def check_all_prices(db: Session):
+    """Check prices for all active products"""
+    product_ids = [product_id for (product_id,) in db.query(Product.id).filter(Product.is_active == True).order_by(Product.id)]
+    db.rollback()  # Don't sit idle in a transaction while pages are fetched
+    
+    logger.info(f"🔍 Checking prices for {len(product_ids)} active products...")
+    
+    # Work in batches so each transaction stays short
+    alerts_queued = 0
+    for start in range(0, len(product_ids), CHECK_BATCH_SIZE):
+        batch_ids = product_ids[start:start + CHECK_BATCH_SIZE]
+        products = db.execute(select(*CHECK_COLUMNS).where(Product.id.in_(batch_ids))).all()
+        db.rollback()  # Plain rows stay usable; the connection goes back to the pool
+        
+        # Fetch the batch concurrently, then apply the results one by one
+        results = await fetch_product_pages(products)
+        
+        checked_at = datetime.utcnow()
+        updates, history_rows = [], []
+        for product, product_info in zip(products, results):
+            try:
+                if isinstance(product_info, Exception):
+                    raise product_info
                 
-                # Check if price alert should be sent
-                if new_price <= product.target_price:
-                    alert = PriceAlert(
-                        product_id=product.id,
-                        product_name=product.name,
-                        current_price=new_price,
-                        target_price=product.target_price,
-                        url=product.url
-                    )
-                    await notifier.send_price_alert(alert)
-                    alerts_sent += 1
+                if product_info.get('not_modified'):
+                    record_not_modified(product, checked_at, updates)
                 
-                if old_price != new_price:
-                    logger.info(f"💰 Price updated for {product.name}: {old_price} -> {new_price}")
+                elif product_info['success'] and product_info['price']:
+                    record_price(product, product_info['price'], checked_at, updates, history_rows,
+                                 product_info.get('validators'))
+                    
                 else:
-                    logger.info(f"📊 Price unchanged for {product.name}: {new_price}")
+                    logger.warning(f"⚠️ Failed to get price for {product.name}: {product_info.get('error', 'Unknown error')}")
                     
-            else:
-                logger.warning(f"⚠️ Failed to get price for {product.name}: {product_info.get('error', 'Unknown error')}")
-                
-        except Exception as e:
-            logger.error(f"❌ Error checking price for {product.name}: {e}")
+            except Exception as e:
+                logger.error(f"❌ Error checking price for {product.name}: {e}")
         
-        # Add delay to avoid being blocked (2-5 seconds random)
-        import random
-        delay = random.uniform(2, 5)
-        time.sleep(delay)
+        # One round-trip each for the batch's product updates and history rows
+        save_price_updates(db, updates, history_rows)
+        
+        # Alerts are evaluated in SQL against the committed prices
+        alerts = claim_price_alerts(db, [row['id'] for row in updates])
+        for alert in alerts:
+            queue_price_alert(alert)
+        alerts_queued += len(alerts)
     
-    logger.info(f"✅ Price check completed! Sent {alerts_sent} alerts.")
+    logger.info(f"✅ Price check completed! Queued {alerts_queued} alerts.")
+
+# Schedule price checks (runs on FastAPI's event loop)
+# A run that starts late (busy loop, slow startup) still goes ahead within 5 minutes
+scheduler = AsyncIOScheduler(job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 300})
 
-# Schedule price checks
 def schedule_price_checks():
     """Schedule regular price checks"""
-    # Schedule every hour
-    schedule.every().hour.do(check_all_prices_sync)
-    # Optional: Also schedule at specific times for more frequent checks
-    schedule.every().day.at("09:00").do(check_all_prices_sync)
-    schedule.every().day.at("15:00").do(check_all_prices_sync)
-    schedule.every().day.at("21:00").do(check_all_prices_sync)
-    
-    logger.info("📅 Scheduled price checks: Every hour + 9AM, 3PM, 9PM daily")
-
-def run_scheduler():
-    """Run the scheduler in a background thread"""
-    logger.info("🚀 Starting background scheduler...")
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
-        except Exception as e:
-            logger.error(f"Scheduler error: {e}")
-            time.sleep(60)
+    # Schedule at the top of every hour
+    scheduler.add_job(check_all_prices_job, 'cron', minute=0, id='hourly-price-check')
+    # Optional: Also schedule at specific times for more frequent checks (offset from the hourly run)
+    scheduler.add_job(check_all_prices_job, 'cron', hour='9,15,21', minute=30, id='daily-price-checks')
+    # Keep /stats fresh (sync job, runs in the scheduler's thread pool)
+    scheduler.add_job(refresh_stats_view, 'interval', minutes=STATS_REFRESH_MINUTES, id='stats-refresh')
+    # Next month's price history partition is always created well ahead of time
+    scheduler.add_job(create_upcoming_partitions, 'cron', hour=0, minute=15, id='price-history-partitions')
+    
+    logger.info("📅 Scheduled price checks: Every hour + 9:30AM, 3:30PM, 9:30PM daily")
+
+# Celery worker queue (enabled when CELERY_BROKER_URL is set)
+celery_app = Celery('tracker', broker=CELERY_BROKER_URL or "redis://localhost:6379/0")
+
+# One event loop per worker process for Telegram sends: the bot's HTTP pool is
+# bound to the loop it first ran on, so a fresh asyncio.run() per alert breaks it
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+@worker_process_init.connect
+def reset_engine_after_fork(**kwargs):
+    """Drop pooled connections inherited from the parent worker process"""
+    global _worker_loop
+    engine.dispose(close=False)
+    _worker_loop = asyncio.new_event_loop()
+
+def run_on_worker_loop(coro):
+    """Run a coroutine to completion on this worker process's event loop"""
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+    return _worker_loop.run_until_complete(coro)
+
+def dispatch_price_checks(db: Session) -> int:
+    """Queue one Celery price check per active product, paced per host"""
+    active = db.query(Product.id, Product.url).filter(Product.is_active == True).order_by(Product.id).all()
+    
+    # Workers scrape synchronously with no limiter of their own, so each host's
+    # checks are staggered to HOST_REQUESTS_PER_MINUTE across the whole cluster
+    interval = 60 / HOST_REQUESTS_PER_MINUTE
+    host_positions: Dict[str, int] = {}
+    checks = []
+    for product_id, url in active:
+        host = urlparse(url).netloc
+        position = host_positions.get(host, 0)
+        host_positions[host] = position + 1
+        checks.append(check_product.s(product_id).set(countdown=position * interval))
+    
+    group(checks).apply_async()
+    logger.info(f"📨 Queued price checks for {len(active)} active products")
+    return len(active)
+
+@celery_app.task
+def check_product(product_id: int):
+    """Check the price of a single product on a Celery worker"""
+    with session_scope() as db:
+        product = db.query(Product).filter(Product.id == product_id, Product.is_active == True).first()
+        if not product:
+            return
+        
+        logger.info(f"Checking: {product.name}")
+        scraper = ScraperFactory.get_scraper(product.url)
+        validators = {'etag': product.etag, 'last_modified': product.last_modified}
+        product_info = scraper.get_product_info(product.url, validators)
+        
+        updates, history_rows = [], []
+        if product_info.get('not_modified'):
+            record_not_modified(product, datetime.utcnow(), updates)
+        elif product_info['success'] and product_info['price']:
+            record_price(product, product_info['price'], datetime.utcnow(), updates, history_rows,
+                         product_info.get('validators'))
+        else:
+            logger.warning(f"⚠️ Failed to get price for {product.name}: {product_info.get('error', 'Unknown error')}")
+            return
+        
+        save_price_updates(db, updates, history_rows)
+        for alert in claim_price_alerts(db, [product.id]):
+            run_on_worker_loop(notifier.send_price_alert(alert))
+
+@celery_app.task
+def check_all_prices_task():
+    """Fan out price checks for all active products (run by Celery beat)"""
+    with session_scope() as db:
+        dispatch_price_checks(db)
+
+@celery_app.task
+def refresh_stats_view_task():
+    """Refresh the /stats materialized view (run by Celery beat)"""
+    refresh_stats_view()
+
+@celery_app.task
+def create_upcoming_partitions_task():
+    """Create upcoming price history partitions (run by Celery beat)"""
+    create_upcoming_partitions()
+
+# Staggered checks can wait past an hour on large lists; keep Redis from
+# redelivering them (and scraping twice) while they sit reserved
+celery_app.conf.broker_transport_options = {'visibility_timeout': 6 * 3600}
+
+celery_app.conf.beat_schedule = {
+    'hourly-price-check': {
+        'task': check_all_prices_task.name,
+        'schedule': crontab(minute=0),
+    },
+    'daily-price-checks': {
+        'task': check_all_prices_task.name,
+        'schedule': crontab(minute=30, hour='9,15,21'),
+    },
+    'stats-refresh': {
+        'task': refresh_stats_view_task.name,
+        'schedule': crontab(minute=f'*/{STATS_REFRESH_MINUTES}'),
+    },
+    'price-history-partitions': {
+        'task': create_upcoming_partitions_task.name,
+        'schedule': crontab(minute=15, hour=0),
+    },
+}
 
 # FastAPI app
 app = FastAPI(
     title="E-Commerce Price Tracker API",
     description="Track product prices from Amazon, Flipkart and get automated notifications",
-    version="2.1.0"
+    version="2.1.0",
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -545,32 +793,38 @@ async def root():
 async def add_product(product: ProductCreate, db: Session = Depends(get_db)):
     """Add a new product to track"""
     
+    url = str(product.url)
+    
     # Get appropriate scraper and validate URL
     try:
-        scraper = ScraperFactory.get_scraper(str(product.url))
-        if not scraper.is_valid_url(str(product.url)):
+        scraper = ScraperFactory.get_scraper(url)
+        if not scraper.is_valid_url(url):
             raise HTTPException(status_code=400, detail="Invalid product URL for this store")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
-    # Check if product already exists
-    existing = db.query(Product).filter(Product.url == str(product.url)).first()
-    if existing:
+    # Check if product already exists: integer index lookup, then confirm the
+    # canonical URLs really match in case of a hash collision
+    product_url_hash = url_hash(url)
+    canonical_url = canonicalize_url(url)
+    candidates = db.query(Product.url).filter(Product.url_hash == product_url_hash)
+    if any(canonicalize_url(tracked_url) == canonical_url for (tracked_url,) in candidates):
         raise HTTPException(status_code=400, detail="Product already being tracked")
     
     # Get initial product info
-    logger.info(f"Fetching info for new product: {product.url}")
-    product_info = scraper.get_product_info(str(product.url))
+    logger.info(f"Fetching info for new product: {url}")
+    product_info = await scraper.get_product_info_async(url, get_http_session())
     if not product_info['success']:
         raise HTTPException(status_code=400, detail=f"Failed to fetch product info: {product_info.get('error', 'Unknown error')}")
     
     # Determine store name
-    store = ScraperFactory.get_store_name(str(product.url))
+    store = ScraperFactory.get_store_name(url)
     
     # Create product record
     db_product = Product(
         name=product.name or product_info['name'],
-        url=str(product.url),
+        url=url,
+        url_hash=product_url_hash,
         current_price=product_info['price'],
         target_price=product.target_price,
         lowest_price=product_info['price'],
@@ -591,6 +845,7 @@ async def add_product(product: ProductCreate, db: Session = Depends(get_db)):
     )
     db.add(price_history)
     db.commit()
+    invalidate_active_product_count()
     
     logger.info(f"✅ Added product: {db_product.name} (Current: {product_info['price']}, Target: {product.target_price}, Store: {store})")
     return db_product
@@ -598,13 +853,12 @@ async def add_product(product: ProductCreate, db: Session = Depends(get_db)):
 @app.get("/products/", response_model=List[ProductResponse])
 async def get_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all tracked products"""
-    products = db.query(Product).offset(skip).limit(limit).all()
-    return products
+    return db.execute(select(*PRODUCT_RESPONSE_COLUMNS).offset(skip).limit(limit)).mappings().all()
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
 async def get_product(product_id: int, db: Session = Depends(get_db)):
     """Get a specific product"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.execute(select(*PRODUCT_RESPONSE_COLUMNS).where(Product.id == product_id)).mappings().first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -618,6 +872,7 @@ async def delete_product(product_id: int, db: Session = Depends(get_db)):
     
     db.delete(product)
     db.commit()
+    invalidate_active_product_count()
     logger.info(f"🗑️ Deleted product: {product.name}")
     return {"message": "Product deleted successfully"}
 
@@ -630,6 +885,7 @@ async def toggle_product(product_id: int, db: Session = Depends(get_db)):
     
     product.is_active = not product.is_active
     db.commit()
+    invalidate_active_product_count()
     status = "activated" if product.is_active else "deactivated"
     logger.info(f"📊 Product {status}: {product.name}")
     return {"message": f"Product {status}"}
@@ -637,27 +893,41 @@ async def toggle_product(product_id: int, db: Session = Depends(get_db)):
 @app.get("/products/{product_id}/history")
 async def get_price_history(product_id: int, days: int = 30, db: Session = Depends(get_db)):
     """Get price history for a product"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.execute(select(Product.name).where(Product.id == product_id)).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     since_date = datetime.utcnow() - timedelta(days=days)
-    history = db.query(PriceHistory).filter(
-        PriceHistory.product_id == product_id,
-        PriceHistory.timestamp >= since_date
-    ).order_by(PriceHistory.timestamp.desc()).all()
+    in_range = (PriceHistory.product_id == product_id, PriceHistory.timestamp >= since_date)
+    # Range served by ix_ph_product_ts (scannable in either direction); capped,
+    # with one extra row fetched to tell whether the cap cut the series short
+    rows = db.query(PriceHistory.price, PriceHistory.timestamp).filter(*in_range).order_by(
+        PriceHistory.timestamp.desc()
+    ).limit(HISTORY_MAX_POINTS + 1).all()
+    truncated = len(rows) > HISTORY_MAX_POINTS
+    history = [{"price": row.price, "timestamp": row.timestamp} for row in rows[:HISTORY_MAX_POINTS]]
     
-    return {
+    # Only a truncated series needs a separate count of everything in range
+    total_records = db.query(func.count()).select_from(PriceHistory).filter(*in_range).scalar() if truncated else len(history)
+    
+    # Returned as a response object so orjson serializes the rows directly,
+    # skipping FastAPI's per-value jsonable_encoder pass
+    return ORJSONResponse({
         "product_id": product_id,
         "product_name": product.name,
-        "history": [{"price": h.price, "timestamp": h.timestamp} for h in history],
-        "total_records": len(history)
-    }
+        "history": history,
+        "total_records": total_records,
+        "truncated": truncated
+    })
 
 @app.post("/check-prices")
 async def manual_price_check(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Manually trigger price check for all products"""
     logger.info("🔍 Manual price check triggered")
+    if CELERY_BROKER_URL:
+        queued = dispatch_price_checks(db)
+        return {"message": f"Price check queued for {queued} products", "status": "queued"}
+    
     background_tasks.add_task(check_all_prices, db)
     return {"message": "Price check started", "status": "running"}
 
@@ -665,10 +935,11 @@ async def manual_price_check(background_tasks: BackgroundTasks, db: Session = De
 async def scheduler_status():
     """Get scheduler status"""
     return {
-        "scheduler_running": True,
-        "next_runs": [str(job.next_run) for job in schedule.jobs] if schedule.jobs else [],
-        "total_jobs": len(schedule.jobs),
-        "check_frequency": "Every hour + 3 daily checks"
+        "scheduler_running": scheduler.running,
+        "next_runs": [str(job.next_run_time) for job in scheduler.get_jobs()],
+        "total_jobs": len(scheduler.get_jobs()),
+        "check_frequency": "Every hour + 3 daily checks",
+        "backend": "celery" if CELERY_BROKER_URL else "in-process"
     }
 
 # Startup event
@@ -676,21 +947,53 @@ async def scheduler_status():
 async def startup_event():
     logger.info("🚀 E-Commerce Price Tracker API with Automated Alerts starting...")
     
+    # Open the shared HTTP connection pool on the serving loop
+    get_http_session()
+    
+    if CELERY_BROKER_URL:
+        logger.info("📨 Price checks are scheduled by Celery beat and run on Celery workers")
+        logger.info("🛍️ Supported stores: Amazon, Flipkart")
+        return
+    
     # Schedule price checks
     schedule_price_checks()
     
-    # Start scheduler in background thread
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
+    scheduler.start()
     
     logger.info("✅ Background scheduler started successfully!")
     logger.info("🔔 Automated alerts are now active!")
     logger.info("🛍️ Supported stores: Amazon, Flipkart")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await close_http_session()
+    if _alert_worker is not None:
+        # Give queued alerts a moment to go out before stopping the sender
+        try:
+            await asyncio.wait_for(_alert_queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Dropping {_alert_queue.qsize()} unsent alerts on shutdown")
+        _alert_worker.cancel()
+
 # Health check endpoint
+ACTIVE_COUNT_CACHE_TTL = 30  # seconds
+_active_count_cache = TTLCache(maxsize=1, ttl=ACTIVE_COUNT_CACHE_TTL)
+
+def get_active_product_count(db: Session) -> int:
+    """Number of active products, cached so frequent health probes skip the database"""
+    if 'count' not in _active_count_cache:
+        _active_count_cache['count'] = db.query(func.count(Product.id)).filter(Product.is_active == True).scalar()
+    return _active_count_cache['count']
+
+def invalidate_active_product_count():
+    """Drop the cached count after products are added, removed or toggled"""
+    _active_count_cache.clear()
+
 @app.get("/health")
 async def health_check(db: Session = Depends(get_db)):
-    active_products = db.query(Product).filter(Product.is_active == True).count()
+    active_products = get_active_product_count(db)
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow(),
@@ -702,32 +1005,43 @@ async def health_check(db: Session = Depends(get_db)):
     }
 
 # Statistics endpoint
+def approximate_row_count(db: Session, table_name: str) -> int:
+    """Planner row estimate for a table, exact count for parts not analyzed yet"""
+    # A partitioned parent is never analyzed by autovacuum, so its estimate is
+    # the sum over its partitions; a plain table only matches itself
+    parts = db.execute(text(
+        "SELECT relname, reltuples::bigint AS estimate FROM pg_class "
+        "WHERE oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = CAST(:name AS regclass)) "
+        "OR (oid = CAST(:name AS regclass) AND relkind = 'r')"
+    ), {"name": table_name}).all()
+    total = 0
+    for part in parts:
+        if part.estimate < 0:
+            total += db.execute(text(f"SELECT count(*) FROM {part.relname}")).scalar()
+        else:
+            total += part.estimate
+    return total
+
 @app.get("/stats")
 async def get_stats(db: Session = Depends(get_db)):
     """Get tracking statistics"""
-    total_products = db.query(Product).count()
-    active_products = db.query(Product).filter(Product.is_active == True).count()
-    total_price_checks = db.query(PriceHistory).count()
+    # Counts come pre-aggregated from the product_stats materialized view
+    counts = db.execute(text("SELECT * FROM product_stats")).one()
     
-    # Count by store
-    amazon_products = db.query(Product).filter(Product.store == "amazon").count()
-    flipkart_products = db.query(Product).filter(Product.store == "flipkart").count()
-    
-    # Recent activity (last 24 hours)
-    since_yesterday = datetime.utcnow() - timedelta(days=1)
-    recent_checks = db.query(PriceHistory).filter(PriceHistory.timestamp >= since_yesterday).count()
+    # Price history only grows, a planner estimate is good enough here
+    total_price_checks = approximate_row_count(db, PriceHistory.__tablename__)
     
     return {
-        "total_products": total_products,
-        "active_products": active_products,
-        "inactive_products": total_products - active_products,
-        "amazon_products": amazon_products,
-        "flipkart_products": flipkart_products,
-        "other_stores": total_products - amazon_products - flipkart_products,
+        "total_products": counts.total_products,
+        "active_products": counts.active_products,
+        "inactive_products": counts.total_products - counts.active_products,
+        "amazon_products": counts.amazon_products,
+        "flipkart_products": counts.flipkart_products,
+        "other_stores": counts.total_products - counts.amazon_products - counts.flipkart_products,
         "total_price_checks": total_price_checks,
-        "recent_checks_24h": recent_checks,
-        "scheduler_jobs": len(schedule.jobs),
-        "last_updated": datetime.utcnow()
+        "recent_checks_24h": counts.recent_checks_24h,
+        "scheduler_jobs": len(scheduler.get_jobs()),
+        "last_updated": counts.refreshed_at
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+"""The windowed parse of large Amazon pages must agree with a full-page parse."""
+import lxml.html
+import pytest
+
+from scrapers import AmazonScraper
+
+
+def large_page(title, price='₹1,29,999'):
+    """A UTF-8 product page padded past SNIPPET_MIN_BYTES, title and buy box far from <meta charset>"""
+    padding = '<div class="filler">' + 'x' * 1000 + '</div>'
+    return (
+        '<html><head><meta charset="utf-8"><title>Amazon.in</title></head><body>'
+        + padding * 40
+        + f'<h1><span id="productTitle">  {title}  </span></h1>'
+        + padding * 40
+        + f'<div class="a-price priceToPay"><span class="a-price-whole">{price}</span></div>'
+        + padding * 40
+        + '</body></html>'
+    ).encode('utf-8')
+
+
+def full_page_fields(html):
+    """Name and price as read from the whole page, bypassing the windows"""
+    doc = lxml.html.fromstring(html)
+    scraper = AmazonScraper()
+    name = AmazonScraper.NAME_SELECTOR.top_match(doc).text_content().strip()
+    price = scraper.extract_price(AmazonScraper.PRICE_SELECTOR.top_match(doc).text_content().strip())
+    return {'name': name, 'price': price}
+
+
+@pytest.mark.parametrize('title', [
+    'Galaxy S24 – 5G ₹',
+    'Café Coffee Day — Filter Coffee 500g',
+    'Plain ASCII title',
+])
+def test_snippets_match_full_page(title):
+    html = large_page(title)
+    assert len(html) > AmazonScraper.SNIPPET_MIN_BYTES
+
+    snippet = AmazonScraper().parse_page_snippets(html)
+    assert snippet is not None
+    assert {'name': snippet['name'], 'price': snippet['price']} == full_page_fields(html)
+    assert snippet['name'] == title
+
+
+def test_multibyte_character_split_at_window_edge():
+    scraper = AmazonScraper()
+    html = large_page('Galaxy S24')
+    title_at = html.find(b'productTitle')
+    before, _ = AmazonScraper.SNIPPET_WINDOW
+    # Put a three-byte character across the window's first byte
+    start = title_at - before
+    html = html[:start - 1] + '₹'.encode('utf-8') + html[start + 2:]
+    assert scraper.parse_page_snippets(html)['name'] == 'Galaxy S24'
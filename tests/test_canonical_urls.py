@@ -0,0 +1,61 @@
+"""Duplicate detection: canonical product URLs and their persisted hashes."""
+import pytest
+
+from scrapers import canonicalize_url, url_hash
+
+
+@pytest.mark.parametrize('url, canonical', [
+    # Amazon's trailing /ref=... referrer segment is dropped
+    ('https://www.amazon.in/dp/B0CHX1W1XY/ref=sr_1_3', 'https://www.amazon.in/dp/B0CHX1W1XY'),
+    ('https://www.amazon.in/Galaxy-S24/dp/B0CHX1W1XY/ref=sr_1_3?keywords=phone',
+     'https://www.amazon.in/Galaxy-S24/dp/B0CHX1W1XY?keywords=phone'),
+    # ...but only as the last segment
+    ('https://www.amazon.in/ref=nav/dp/B0CHX1W1XY', 'https://www.amazon.in/ref=nav/dp/B0CHX1W1XY'),
+    # Tracking and utm_* parameters are removed, the rest keep their order
+    ('https://www.amazon.in/dp/B0CHX1W1XY?tag=aff-21&th=1&linkCode=sl1&psc=1&utm_source=x&utm_medium=y',
+     'https://www.amazon.in/dp/B0CHX1W1XY?th=1&psc=1'),
+    ('https://www.amazon.in/dp/B0CHX1W1XY?ref_=nav&ref=x&camp=1&creative=2&creativeASIN=B0&linkId=abc',
+     'https://www.amazon.in/dp/B0CHX1W1XY'),
+    # Flipkart's pid/lid pick the listing and must survive
+    ('https://www.flipkart.com/galaxy-s24/p/itm123?pid=MOBGX2F3&lid=LSTMOBGX2F3&marketplace=FLIPKART&utm_campaign=z',
+     'https://www.flipkart.com/galaxy-s24/p/itm123?pid=MOBGX2F3&lid=LSTMOBGX2F3&marketplace=FLIPKART'),
+    # Scheme and host are case-insensitive, the path (ASINs, slugs) is not
+    ('HTTPS://WWW.Amazon.IN/dp/B0CHX1W1XY', 'https://www.amazon.in/dp/B0CHX1W1XY'),
+    # Fragments never reach the server
+    ('https://www.amazon.in/dp/B0CHX1W1XY#customerReviews', 'https://www.amazon.in/dp/B0CHX1W1XY'),
+    # Blank parameters are kept as they were
+    ('https://www.flipkart.com/x/p/itm1?pid=A&q=', 'https://www.flipkart.com/x/p/itm1?pid=A&q='),
+])
+def test_canonicalize_url(url, canonical):
+    assert canonicalize_url(url) == canonical
+
+
+def test_tracking_variants_share_a_hash():
+    variants = [
+        'https://www.amazon.in/dp/B0CHX1W1XY',
+        'https://www.amazon.in/dp/B0CHX1W1XY/ref=sr_1_3',
+        'https://www.amazon.in/dp/B0CHX1W1XY?tag=aff-21&utm_source=newsletter',
+        'HTTPS://www.amazon.in/dp/B0CHX1W1XY#reviews',
+    ]
+    assert len({url_hash(url) for url in variants}) == 1
+
+
+def test_different_listings_get_different_hashes():
+    assert url_hash('https://www.flipkart.com/x/p/itm1?pid=A') != url_hash('https://www.flipkart.com/x/p/itm1?pid=B')
+    assert url_hash('https://www.amazon.in/dp/B0CHX1W1XY') != url_hash('https://www.amazon.in/dp/b0chx1w1xy')
+
+
+# url_hash is stored in products.url_hash and backfilled by a migration; a change
+# to these values would silently break duplicate detection for existing rows
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.amazon.in/dp/B0CHX1W1XY', 841270010880964900),
+    ('https://www.flipkart.com/samsung-galaxy-s24/p/itm123?pid=MOBGX2F3&lid=LSTMOBGX2F3', 760857187701941162),
+    ('', -1205034819632174695),
+])
+def test_url_hash_is_stable(url, expected):
+    assert url_hash(url) == expected
+
+
+def test_url_hash_fits_bigint():
+    for url in ['https://www.amazon.in/dp/B0CHX1W1XY', 'https://www.flipkart.com/x/p/itm1?pid=A', '']:
+        assert -2**63 <= url_hash(url) < 2**63
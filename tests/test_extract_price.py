@@ -0,0 +1,46 @@
+"""extract_price must keep reading prices the way the original strip-then-match version did."""
+import re
+
+import pytest
+
+from scrapers import BaseScraper
+
+
+def original_extract_price(text):
+    """The first implementation: strip currency, commas and whitespace, then match"""
+    if not text:
+        return None
+    price_text_clean = re.sub(r'[₹$€£¥,\s]', '', text)
+    price_match = re.search(r'[\d]+\.?\d*', price_text_clean)
+    return float(price_match.group()) if price_match else None
+
+
+CASES = [
+    ('₹1,299', 1299.0),
+    ('₹1,29,999.00', 129999.0),
+    ('$49.99', 49.99),
+    ('1,299.', 1299.0),
+    ('1 299', 1299.0),
+    ('₹ 1 299', 1299.0),
+    ('1 299,00', 129900.0),
+    ('1 299', 1299.0),
+    ('1,299 .50', 1299.5),
+    ('  ₹2,499  ', 2499.0),
+    ('M.R.P.: ₹1,499', 1499.0),
+    ('Rs. 350', 350.0),
+    ('€ 12.5', 12.5),
+    ('Save 200 today', 200.0),
+    ('', None),
+    ('Currently unavailable', None),
+    (None, None),
+]
+
+
+@pytest.mark.parametrize('text, expected', CASES)
+def test_extract_price(text, expected):
+    assert BaseScraper().extract_price(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', CASES)
+def test_matches_original_implementation(text, expected):
+    assert original_extract_price(text) == expected
@@ -0,0 +1,102 @@
+"""PrioritySelector must pick exactly what lxml's CSSSelector picks, selector by selector."""
+import random
+
+import lxml.html
+import pytest
+from lxml.cssselect import CSSSelector
+
+from scrapers import AmazonScraper, FlipkartScraper, PrioritySelector
+
+
+def expected_matches(selectors, doc):
+    """First match of each selector in priority order, via plain CSSSelector"""
+    matches = []
+    for selector in selectors:
+        found = CSSSelector(selector)(doc)
+        if found:
+            matches.append(found[0])
+    return matches
+
+
+STORE_SELECTORS = [
+    AmazonScraper.NAME_SELECTOR,
+    AmazonScraper.PRICE_SELECTOR,
+    FlipkartScraper.NAME_SELECTOR,
+    FlipkartScraper.PRICE_SELECTOR,
+]
+
+PAGES = [
+    # Descendant selector where only a later target sits under the right ancestor
+    '<div><span class="a-price-whole">1</span>'
+    '<span class="a-price priceToPay"><b><span class="a-price-whole">2</span></b></span></div>',
+    # Multi-class compound needs every class, not just one of them
+    '<div class="Nx9bqj">1</div><div class="CxhGGd Nx9bqj">2</div><div class="_30jeq3 _1_WHN1">3</div>',
+    # Class names that only contain a selector's class as a substring
+    '<span class="a-pricey"><span class="a-price-whole-x">1</span></span>'
+    '<span class="a-price"><span class="a-offscreen">2</span></span>',
+    # Tag must match as well as the class
+    '<h2 class="_6EBuvT"><span class="VU-ZEz">a</span></h2><h1 class="yhB1nd">b</h1>',
+    # Nested ancestors several levels up, with extra whitespace in class attributes
+    '<h1 class=" _6EBuvT  x"><div><p><span class="y  VU-ZEz">a</span></p></div></h1>',
+    # Id selector outranks everything else
+    '<h1 class="a-size-large">a</h1><span id="productTitle">b</span><span class="product-title">c</span>',
+    # Nothing matches at all
+    '<div><p class="other">x</p></div>',
+]
+
+
+@pytest.mark.parametrize("page", PAGES)
+@pytest.mark.parametrize("selector", STORE_SELECTORS)
+def test_store_selectors_on_edge_cases(selector, page):
+    doc = lxml.html.fromstring(page)
+    assert list(selector.first_matches(doc)) == expected_matches(selector.selectors, doc)
+
+
+def test_nested_descendants_and_ids():
+    selectors = ['#main .a .b', 'div.a span.b', '.a .b .c', 'p.c', '.b']
+    selector = PrioritySelector(selectors)
+    doc = lxml.html.fromstring(
+        '<div><div class="a"><p class="c">1</p><span class="b">2</span></div>'
+        '<section id="main"><div class="a"><p><i class="b c">3</i></p></div></section>'
+        '<div class="a"><em class="b"><span class="c">4</span></em></div></div>'
+    )
+    assert list(selector.first_matches(doc)) == expected_matches(selectors, doc)
+
+
+def test_top_match_is_first_selector_only():
+    doc = lxml.html.fromstring('<h1 class="a-size-large">a</h1>')
+    assert AmazonScraper.NAME_SELECTOR.top_match(doc) is None
+    doc = lxml.html.fromstring('<h1 class="a-size-large">a</h1><span id="productTitle">b</span>')
+    assert AmazonScraper.NAME_SELECTOR.top_match(doc).text == 'b'
+
+
+def test_unsupported_selector_is_rejected():
+    with pytest.raises(ValueError):
+        PrioritySelector(['div.a', 'div > span'])
+
+
+TAGS = ['div', 'span', 'h1', 'p', 'b']
+CLASSES = [
+    'a-price', 'priceToPay', 'a-price-whole', 'a-offscreen', 'a-text-price', 'apexPriceToPay',
+    'a-size-large', 'product-title', 'Nx9bqj', 'CxhGGd', '_30jeq3', '_16Jk6d', '_1_WHN1',
+    '_6EBuvT', 'VU-ZEz', 'B_NuCI', 'yhB1nd', 'a-pricey', 'a-price-whole-x',
+]
+
+
+def random_page(rng, depth=0):
+    """Random markup drawn from the tags and classes the store selectors use"""
+    children = []
+    for _ in range(rng.randint(0, 4 if depth < 4 else 0)):
+        tag = rng.choice(TAGS)
+        classes = ' '.join(rng.sample(CLASSES, rng.randint(0, 3)))
+        element_id = ' id="productTitle"' if rng.random() < 0.03 else ''
+        children.append(f'<{tag} class="{classes}"{element_id}>x{random_page(rng, depth + 1)}</{tag}>')
+    return ''.join(children)
+
+
+@pytest.mark.parametrize("selector", STORE_SELECTORS)
+def test_store_selectors_on_random_pages(selector):
+    rng = random.Random(1234)
+    for _ in range(300):
+        doc = lxml.html.fromstring(f'<html><body>{random_page(rng)}</body></html>')
+        assert list(selector.first_matches(doc)) == expected_matches(selector.selectors, doc)
@@ -0,0 +1,79 @@
+"""Fields extracted from saved product pages, through every parse path each store uses.
+
+The fixtures are trimmed copies of the stores' product-page markup: the real
+class names and nesting around the title and prices, plus decoys (sponsored
+cards, list prices, similar products) that must not be picked up.
+"""
+from pathlib import Path
+
+import pytest
+
+from scrapers import PAGE_HEAD_BYTES, AmazonScraper, FlipkartScraper
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+AMAZON_FIELDS = {
+    'name': 'Samsung Galaxy S24 5G (Onyx Black, 8GB, 256GB Storage) – AI Phone',
+    'price': 74999.0,
+    'success': True,
+}
+
+FLIPKART_FIELDS = {
+    'name': 'SAMSUNG Galaxy S24 5G (Onyx Black, 256 GB)  (8 GB RAM)',
+    'price': 74999.0,
+    'old_price': None,  # 'div.yRaY8j.A6+E6v' is an adjacent-sibling selector and never matches
+    'discount': '6% off',
+    'reviews': '1,24,386 Ratings\xa0&\xa07,312 Reviews',
+}
+
+
+def load(name):
+    return (FIXTURES / name).read_bytes()
+
+
+def padded(html, before, size):
+    """Insert `size` bytes of scripts ahead of `before`, as real pages carry"""
+    at = html.index(before)
+    filler = b'<script>var x = "' + b'x' * size + b'";</script>'
+    return html[:at] + filler + html[at:]
+
+
+def test_amazon_small_page():
+    html = load('amazon_product.html')
+    assert len(html) <= AmazonScraper.SNIPPET_MIN_BYTES
+    assert AmazonScraper().parse_product_page(html) == AMAZON_FIELDS
+
+
+@pytest.mark.parametrize('marker', [b'<div id="dp-container"', b'<div id="corePriceDisplay', b'</body>'])
+def test_amazon_large_page(marker):
+    # Large pages take the windowed parse; filler placed before, between and
+    # after the title and price must not change the result
+    html = padded(load('amazon_product.html'), marker, 200 * 1024)
+    assert len(html) > AmazonScraper.SNIPPET_MIN_BYTES
+    assert AmazonScraper().parse_product_page(html) == AMAZON_FIELDS
+
+
+def test_amazon_page_without_buy_box_marker():
+    # No 'priceToPay' anywhere: the windowed parse gives up and the full parse runs
+    html = padded(load('amazon_product.html'), b'</body>', 200 * 1024).replace(b'priceToPay', b'priceX')
+    fields = AmazonScraper().parse_product_page(html)
+    assert fields['name'] == AMAZON_FIELDS['name']
+    assert fields['price'] == 74999.0  # from '.a-price.reinventPricePriceToPayMargin .a-price-whole'
+
+
+def test_flipkart_page():
+    assert FlipkartScraper().parse_product_page(load('flipkart_product.html')) == FLIPKART_FIELDS
+
+
+def test_flipkart_fields_past_page_head():
+    # Name and price beyond PAGE_HEAD_BYTES: the head parse misses them and the full page is parsed
+    html = padded(load('flipkart_product.html'), b'<div id="container">', PAGE_HEAD_BYTES)
+    assert FlipkartScraper().parse_product_page(html) == FLIPKART_FIELDS
+
+
+def test_reparse_of_identical_body_is_cached():
+    scraper = AmazonScraper()
+    html = load('amazon_product.html')
+    first = scraper.parse_cached('https://www.amazon.in/dp/B0CS5XW6TN', html, scraper.parse_product_page)
+    again = scraper.parse_cached('https://www.amazon.in/dp/B0CS5XW6TN', html, lambda body: pytest.fail('reparsed'))
+    assert first == again == AMAZON_FIELDS